@@ -8,49 +8,76 @@ warnings.filterwarnings(
 )
 
 import streamlit as st
+import pandas as pd
 import threading
 from datetime import datetime
-# noinspection PyUnresolvedReference
-from google import genai
 import os
 from dotenv import load_dotenv
 
-from src.vector_store import QdrantVectorStore
-from src.vector_store import QdrantVectorStore
+from src.vector_store import QdrantVectorStore, is_remote_location
 from src.workflow import FactCheckingWorkflow
-from src.cache import SimpleCache
-from src.gemini_router import GeminiRouter
+from src.cache import SemanticCache
+from src.gemini_router import GeminiRouter, default_genai_client
+from src.search import MultiSourceSearch
 
 # Load environment variables
 load_dotenv()
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+# One Gemini client per process; reruns reuse its connection pool
+client = default_genai_client()
 QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_data")
 _VECTOR_STORE_LOCK = threading.Lock()
 
-# Initialize session state
+# Shared resources (one instance per process, reused by every session)
 @st.cache_resource(show_spinner=False)
 def get_vector_store(storage_path: str) -> QdrantVectorStore:
+    if is_remote_location(storage_path):
+        # Qdrant server over gRPC: one shared client serves all sessions concurrently.
+        return QdrantVectorStore(storage_path)
     # Streamlit can execute scripts concurrently across sessions; local Qdrant storage
     # cannot be opened by multiple clients at the same time.
     with _VECTOR_STORE_LOCK:
         return QdrantVectorStore(storage_path)
 
 
-if "vector_store" not in st.session_state:
-    st.session_state.vector_store = get_vector_store(QDRANT_PATH)
+@st.cache_resource(show_spinner=False)
+def get_router(_client) -> GeminiRouter:
+    # Shared across sessions and reruns so the response cache and rate limits are global.
+    return GeminiRouter(client=_client)
+
+
+@st.cache_resource(show_spinner=False)
+def get_search() -> MultiSourceSearch:
+    return MultiSourceSearch()
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache(_vector_store: QdrantVectorStore) -> SemanticCache:
+    return SemanticCache(_vector_store, ttl_hours=24)
+
 
-if "workflow" not in st.session_state:
-    st.session_state.workflow = FactCheckingWorkflow(
-        st.session_state.vector_store,
-        client=client
+@st.cache_resource(show_spinner=False)
+def get_workflow(_vector_store: QdrantVectorStore, _client) -> FactCheckingWorkflow:
+    return FactCheckingWorkflow(
+        _vector_store,
+        client=_client,
+        router=get_router(_client),
+        search_engine=get_search(),
+        cache=get_cache(_vector_store)
     )
 
-if "cache" not in st.session_state:
-    st.session_state.cache = SimpleCache(ttl_hours=24)
 
-if "router" not in st.session_state:
-    st.session_state.router = GeminiRouter(client=client)
+@st.cache_data(ttl=5, show_spinner=False)
+def get_collection_stats(_vector_store: QdrantVectorStore) -> dict:
+    # Sidebar reruns on every widget interaction; a few seconds of staleness is fine.
+    return _vector_store.get_all_collection_stats(["politics", "economics", "health"])
+
+
+vector_store = get_vector_store(QDRANT_PATH)
+router = get_router(client)
+cache = get_cache(vector_store)
+workflow = get_workflow(vector_store, client)
 
+# Per-user state
 if "history" not in st.session_state:
     st.session_state.history = []
 
@@ -70,7 +97,7 @@ with st.sidebar:
     st.header("📊 System Status")
     
     # Search quota
-    quota = st.session_state.workflow.mcp_client.get_server_status()
+    quota = workflow.mcp_client.get_server_status()
     st.subheader("Search Quota")
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -90,12 +117,12 @@ with st.sidebar:
     
     # Cache stats
     st.subheader("Cache")
-    cache_stats = st.session_state.cache.get_stats()
+    cache_stats = cache.get_stats()
     st.metric("Cached Results", cache_stats["size"])
     
     # Gemini router stats
     st.subheader("Gemini Models")
-    router_stats = st.session_state.router.get_stats()
+    router_stats = router.get_stats()
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric(
@@ -118,9 +145,10 @@ with st.sidebar:
     
     # Collection stats
     st.subheader("Vector Store")
-    politics_stats = st.session_state.vector_store.get_collection_stats("politics")
-    economics_stats = st.session_state.vector_store.get_collection_stats("economics")
-    health_stats = st.session_state.vector_store.get_collection_stats("health")
+    collection_stats = get_collection_stats(vector_store)
+    politics_stats = collection_stats["politics"]
+    economics_stats = collection_stats["economics"]
+    health_stats = collection_stats["health"]
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -147,24 +175,37 @@ with col2:
     verify_button = st.button("✓ සත්‍යාපනය", width="stretch")
 
 # Verification logic
-if verify_button and statement:
-    # Check cache first
-    cached_result = st.session_state.cache.get(statement)
+@st.fragment(run_every=0.5)
+def poll_verification():
+    """Poll the running verification; only this fragment reruns until it finishes."""
+    pending = st.session_state.pending
+    if not pending["future"].done():
+        st.info("⏳ පරීක්ෂා කරමින්... (Checking...)")
+        return
     
-    if cached_result:
-        st.info("🎯 Cache hit - Using cached result")
-        result = cached_result
-        cached = True
+    del st.session_state.pending
+    try:
+        result = pending["future"].result()
+    except (RuntimeError, ValueError) as e:
+        st.session_state.error = f"Error during verification: {str(e)}"
     else:
-        # Verify claim
-        with st.spinner("පරීක්ෂා කරමින්... (Checking...)"):
-            try:
-                result = st.session_state.workflow.verify(statement)
-                st.session_state.cache.set(statement, result)
-                cached = False
-            except (RuntimeError, ValueError) as e:
-                st.error(f"Error during verification: {str(e)}")
-                st.stop()
+        st.session_state.last_result = result
+        # Add to history
+        st.session_state.history.append({
+            "timestamp": datetime.now(),
+            "statement": pending["statement"],
+            "verdict": result.get("verdict", "unknown"),
+            "cached": result.get("cached", False)
+        })
+    # Redraw the whole page with the result
+    st.rerun()
+
+
+def show_result(result: dict) -> None:
+    """Render a finished verification."""
+    cached = result.get("cached", False)
+    if cached:
+        st.info("🎯 Cache hit - Using cached result")
     
     # Display results
     st.divider()
@@ -203,28 +244,38 @@ if verify_button and statement:
         for i, doc in enumerate(result.get("retrieved_docs", [])[:3]):
             st.write(f"**{i+1}. {doc.get('source', 'Unknown')}** (Score: {doc.get('score', 0):.2f})")
             st.text(doc.get("text", "")[:200] + "...")
-    
-    # Add to history
-    st.session_state.history.append({
-        "timestamp": datetime.now(),
+
+
+if verify_button and statement and "pending" not in st.session_state:
+    # Verify claim; the workflow answers repeated or reworded claims from its
+    # semantic cache. The run happens on the workflow's background event loop,
+    # so the script thread stays free and the page keeps responding; the
+    # fragment below polls for the result.
+    st.session_state.pop("last_result", None)
+    st.session_state.pop("error", None)
+    st.session_state.pending = {
         "statement": statement,
-        "verdict": verdict,
-        "cached": cached
-    })
+        "future": workflow.verify_background(statement)
+    }
+
+if "pending" in st.session_state:
+    poll_verification()
+elif "error" in st.session_state:
+    st.error(st.session_state.error)
+elif "last_result" in st.session_state:
+    show_result(st.session_state.last_result)
 
 # History section
 if st.session_state.history:
     st.divider()
     st.subheader("📚 ඉතිහාසය (History)")
     
-    history_df = []
-    for item in st.session_state.history[-10:]:  # Last 10
-        history_df.append({
-            "සમයය": item["timestamp"].strftime("%H:%M:%S"),
-            "ප්‍රකාශය": item["statement"][:50] + "...",
-            "නිගමනය": item["verdict"],
-            "Cache": "✓" if item["cached"] else "✗"
-        })
+    history_df = pd.DataFrame(st.session_state.history[-10:])  # Last 10
+    history_df = pd.DataFrame({
+        "සમයය": history_df["timestamp"].dt.strftime("%H:%M:%S"),
+        "ප්‍රකාශය": history_df["statement"].str.slice(0, 50) + "...",
+        "නිගමනය": history_df["verdict"],
+        "Cache": history_df["cached"].map({True: "✓", False: "✗"})
+    })
     
-    if history_df:
-        st.dataframe(history_df, width="stretch")
+    st.dataframe(history_df, width="stretch")
@@ -9,12 +9,12 @@ warnings.filterwarnings(
 
 import os
 from dotenv import load_dotenv
-from google import genai  # type: ignore[attr-defined]
 
 from src.vector_store import QdrantVectorStore
+from src.gemini_router import default_genai_client, default_router
 from src.search import MultiSourceSearch
 from src.workflow import FactCheckingWorkflow
-from src.cache import SimpleCache
+from src.cache import SemanticCache
 from src.async_processor import AsyncFactChecker
 
 # Load environment variables
@@ -27,14 +27,15 @@ def initialize():
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("GOOGLE_API_KEY not set in .env file")
-    # New SDK uses Client instance
-    client = genai.Client(api_key=api_key)
+    # New SDK uses Client instance; shared per process across initialize() calls
+    client = default_genai_client()
     qdrant_path = os.getenv("Qdrant_PATH", "./qdrant_data")
     
     # Initialize components
     vector_store = QdrantVectorStore(qdrant_path)
-    workflow = FactCheckingWorkflow(vector_store, client=client)
-    cache = SimpleCache(ttl_hours=24)
+    cache = SemanticCache(vector_store, ttl_hours=24)
+    # Shared router: one set of rate-limit windows and one response cache per process
+    workflow = FactCheckingWorkflow(vector_store, client=client, router=default_router(), cache=cache)
     async_checker = AsyncFactChecker(workflow, max_concurrent=10)
     
     return {
@@ -48,47 +49,24 @@ def initialize():
 def verify_statement(statement: str, use_cache: bool = True) -> dict:
     """Verify a single statement."""
     components = initialize()
-    cache = components["cache"]
     workflow = components["workflow"]
     
-    if use_cache:
-        cached = cache.get(statement)
-        if cached:
-            return {"cached": True, **cached}
-    
-    result = workflow.verify(statement)
-    cache.set(statement, result)
-    return {"cached": False, **result}
+    # The workflow checks and fills the semantic cache itself
+    return workflow.verify(statement, use_cache=use_cache)
 
 
 async def verify_batch(statements: list, use_rate_limit: bool = False) -> list:
     """Verify multiple statements."""
     components = initialize()
     async_checker = components["async_checker"]
-    cache = components["cache"]
-    
-    results = []
-    for stmt in statements:
-        cached = cache.get(stmt)
-        if cached:
-            results.append({"cached": True, **cached})
-        else:
-            results.append({"cached": False})
     
+    # The workflow consults and fills the semantic cache for every statement
     if use_rate_limit:
-        batch_results = await async_checker.verify_with_rate_limit(
+        return await async_checker.verify_with_rate_limit(
             statements,
             rate_limit_per_second=0.5
         )
-    else:
-        batch_results = await async_checker.verify_batch(statements)
-    
-    for i, result in enumerate(batch_results):
-        if not results[i].get("cached"):
-            results[i] = result
-            cache.set(statements[i], result)
-    
-    return results
+    return await async_checker.verify_batch(statements)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 """Async batch processing for multiple claims."""
 import asyncio
+import time
 from typing import List
 
 
@@ -10,9 +11,27 @@ class AsyncFactChecker:
         """Initialize async processor."""
         self.workflow = workflow
         self.max_concurrent = max_concurrent
+        # Earliest monotonic time the next rate-limited request may start
+        self._next_allowed_at = time.monotonic()
     
     async def verify_batch(self, statements: List[str]) -> List[dict]:
         """Verify multiple statements concurrently."""
+        if hasattr(self.workflow, "verify_batch_async"):
+            # Batched path: one embedding pass + batched vector search,
+            # semaphore only bounds the per-claim Gemini/web stages.
+            results = await self.workflow.verify_batch_async(
+                statements,
+                max_concurrent=self.max_concurrent
+            )
+            return [
+                r if not isinstance(r, BaseException) else {
+                    "statement": statement,
+                    "error": str(r),
+                    "verdict": "error"
+                }
+                for statement, r in zip(statements, results)
+            ]
+        
         semaphore = asyncio.Semaphore(self.max_concurrent)
         
         async def verify_with_limit(statement: str):
@@ -38,27 +57,38 @@ class AsyncFactChecker:
             for r in results
         ]
     
+    async def _wait_for_slot(self, delay: float) -> None:
+        """Reserve the next start slot, sleeping only if it lies in the future."""
+        now = time.monotonic()
+        start = max(now, self._next_allowed_at)
+        self._next_allowed_at = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
+    
     async def verify_with_rate_limit(
         self,
         statements: List[str],
         rate_limit_per_second: float = 1.0
     ) -> List[dict]:
-        """Verify with rate limiting (useful for API limits)."""
-        results = []
+        """Verify with rate limiting (useful for API limits).
+        
+        Request starts are spaced at least `1 / rate_limit_per_second` seconds
+        apart, but requests overlap (up to `max_concurrent`) and no delay is
+        added when the previous start is already far enough in the past.
+        """
         delay = 1.0 / rate_limit_per_second
+        semaphore = asyncio.Semaphore(self.max_concurrent)
         
-        for i, statement in enumerate(statements):
-            if i > 0:
-                await asyncio.sleep(delay)
-            
-            try:
-                result = await self.workflow.verify_async(statement)
-                results.append(result)
-            except (RuntimeError, ValueError) as e:
-                results.append({
-                    "statement": statement,
-                    "error": str(e),
-                    "verdict": "error"
-                })
+        async def verify_paced(statement: str):
+            async with semaphore:
+                await self._wait_for_slot(delay)
+                try:
+                    return await self.workflow.verify_async(statement)
+                except (RuntimeError, ValueError) as e:
+                    return {
+                        "statement": statement,
+                        "error": str(e),
+                        "verdict": "error"
+                    }
         
-        return results
+        return await asyncio.gather(*[verify_paced(s) for s in statements])
@@ -1,56 +1,255 @@
 """Simple in-memory caching with TTL."""
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional
+
+from qdrant_client.models import (
+    Filter, FieldCondition, FilterSelector, PointStruct, Range,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams
+)
+
+from .models import domain_filter
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - optional speedup
+    xxhash = None
 
 
 class SimpleCache:
     """In-memory cache without Redis dependency."""
     
-    def __init__(self, ttl_hours: int = 24):
-        """Initialize cache with time-to-live in hours."""
-        self.cache: Dict[str, tuple] = {}
+    # Expired entries are swept once every this many set() calls
+    SWEEP_INTERVAL = 128
+    
+    def __init__(self, ttl_hours: int = 24, max_size: int = 1000):
+        """Initialize LRU cache with time-to-live in hours."""
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
         self.ttl = timedelta(hours=ttl_hours)
+        self.max_size = max_size
+        self._sets_since_sweep = 0
+        # One instance is shared by Streamlit worker threads and asyncio.to_thread calls
+        self._lock = threading.Lock()
     
     def _hash(self, statement: str) -> str:
-        """Create hash of statement."""
-        return hashlib.md5(statement.encode()).hexdigest()
+        """Create hash of statement (non-cryptographic, only used as a dict key)."""
+        data = statement.encode("utf-8")
+        if xxhash is not None:
+            return xxhash.xxh3_64_hexdigest(data)
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
     
     def get(self, statement: str) -> Optional[dict]:
         """Get cached result if not expired."""
         key = self._hash(statement)
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            if datetime.now() - timestamp < self.ttl:
-                return data
-            else:
-                # Expired, remove it
-                del self.cache[key]
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                data, timestamp = entry
+                if datetime.now() - timestamp < self.ttl:
+                    self.cache.move_to_end(key)
+                    return data
+                else:
+                    # Expired, remove it
+                    del self.cache[key]
         return None
     
     def set(self, statement: str, result: dict) -> None:
         """Store result in cache."""
         key = self._hash(statement)
-        self.cache[key] = (result, datetime.now())
+        with self._lock:
+            self.cache[key] = (result, datetime.now())
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.max_size:
+                # Evict least recently used
+                self.cache.popitem(last=False)
+            
+            self._sets_since_sweep += 1
+            if self._sets_since_sweep >= self.SWEEP_INTERVAL:
+                self._sweep()
+    
+    def _sweep(self) -> int:
+        """Remove expired entries (caller holds the lock)."""
+        now = datetime.now()
+        expired = [k for k, v in self.cache.items() if now - v[1] >= self.ttl]
+        for k in expired:
+            del self.cache[k]
+        self._sets_since_sweep = 0
+        return len(expired)
     
     def clear_old(self) -> int:
         """Remove expired entries and return count removed."""
-        now = datetime.now()
-        original_size = len(self.cache)
-        self.cache = {
-            k: v for k, v in self.cache.items()
-            if now - v[1] < self.ttl
-        }
-        return original_size - len(self.cache)
+        with self._lock:
+            return self._sweep()
     
     def clear_all(self) -> None:
         """Clear entire cache."""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
     
     def get_stats(self) -> dict:
-        """Get cache statistics."""
-        self.clear_old()
+        """Get cache statistics (O(1); expired entries are swept lazily)."""
         return {
             "size": len(self.cache),
             "ttl_hours": self.ttl.total_seconds() / 3600
         }
+
+
+class SemanticCache(SimpleCache):
+    """Exact-match cache backed by a Qdrant similarity lookup for paraphrases.
+
+    The in-memory dict stays the L1 layer; misses fall through to a nearest
+    neighbour search over previously verified statements, so a reworded claim
+    is served without re-running the workflow.
+    """
+
+    collection_name = "fact_cache"
+
+    # 1-bit vectors pick the candidates; the top ones are re-scored with the
+    # full-precision originals so the 0.92 threshold still applies to cosine.
+    search_params = SearchParams(
+        quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+    )
+
+    def __init__(
+        self,
+        vector_store,
+        ttl_hours: int = 24,
+        score_threshold: float = 0.92,
+        max_size: int = 1000
+    ):
+        """Initialize cache on top of an existing vector store (shares its client and encoder)."""
+        super().__init__(ttl_hours=ttl_hours, max_size=max_size)
+        self.vector_store = vector_store
+        self.qdrant = vector_store.qdrant
+        self.score_threshold = score_threshold
+        self._upserts_since_prune = 0
+        self._ensure_collection()
+        # Drop verdicts that expired while the app was down
+        self._prune_expired()
+
+    def _ensure_collection(self) -> None:
+        """Create the cache collection with binary quantization."""
+        self.vector_store.ensure_collection(
+            self.collection_name,
+            quantization_config=BinaryQuantization(
+                binary=BinaryQuantizationConfig(always_ram=True)
+            )
+        )
+
+    def _point_id(self, key: str) -> int:
+        """Derive a stable Qdrant point id from the statement hash."""
+        return int(key[:16], 16)
+
+    def _domain_filter(self, domain: Optional[str]) -> Optional[Filter]:
+        """Restrict lookups to one domain so verdicts never leak across domains."""
+        if not domain:
+            return None
+        return domain_filter(domain)
+
+    def _nearest(self, statement: str, domain: Optional[str], vector=None):
+        """Return the closest cached point above the score threshold, if any."""
+        query_vector = vector if vector is not None else self.vector_store.embed(statement)
+        hits = self.qdrant.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            limit=1,
+            query_filter=self._domain_filter(domain),
+            score_threshold=self.score_threshold,
+            search_params=self.search_params,
+            with_payload=True,
+            with_vectors=False,
+        ).points
+        return hits[0] if hits else None
+
+    def get_exact(self, statement: str) -> Optional[dict]:
+        """Exact-match (in-memory) lookup only; no embedding or Qdrant call."""
+        return super().get(statement)
+
+    def get(self, statement: str, domain: Optional[str] = None, vector=None) -> Optional[dict]:
+        """Get cached result for the statement or a close paraphrase of it.
+
+        Pass the statement's `vector` from QdrantVectorStore.embed() if it is
+        already computed, so the statement is not encoded again.
+        """
+        data = super().get(statement)
+        if data is not None:
+            return data
+
+        try:
+            hit = self._nearest(statement, domain, vector)
+        except Exception:
+            # The semantic layer is best-effort; a failed lookup is just a miss.
+            return None
+        if hit is None:
+            return None
+
+        timestamp = datetime.fromtimestamp(hit.payload.get("timestamp", 0))
+        if datetime.now() - timestamp >= self.ttl:
+            return None
+        return hit.payload.get("result")
+
+    def set(self, statement: str, result: dict, domain: Optional[str] = None, vector=None) -> None:
+        """Store result in both the exact-match and the semantic layer."""
+        super().set(statement, result)
+        if vector is None:
+            vector = self.vector_store.embed(statement)
+        try:
+            self.qdrant.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    PointStruct(
+                        id=self._point_id(self._hash(statement)),
+                        vector=vector.tolist(),
+                        payload={
+                            "statement": statement,
+                            "domain": domain or result.get("domain", ""),
+                            "result": result,
+                            "timestamp": datetime.now().timestamp()
+                        }
+                    )
+                ]
+            )
+        except Exception as e:
+            # A failed write only costs a future miss, but shouldn't go unnoticed
+            print(f"⚠️ Semantic cache upsert failed: {e}")
+            return
+
+        with self._lock:
+            self._upserts_since_prune += 1
+            prune = self._upserts_since_prune >= self.SWEEP_INTERVAL
+            if prune:
+                self._upserts_since_prune = 0
+        if prune:
+            self._prune_expired()
+
+    def _prune_expired(self) -> None:
+        """Delete cached points older than the TTL (max_size only bounds the in-memory layer)."""
+        cutoff = (datetime.now() - self.ttl).timestamp()
+        try:
+            self.qdrant.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(
+                    filter=Filter(must=[FieldCondition(key="timestamp", range=Range(lt=cutoff))])
+                ),
+                wait=False
+            )
+        except Exception as e:
+            print(f"⚠️ Semantic cache prune failed: {e}")
+
+    def clear_old(self) -> int:
+        """Remove expired entries from both layers; returns the in-memory count removed."""
+        removed = super().clear_old()
+        self._prune_expired()
+        return removed
+
+    def clear_all(self) -> None:
+        """Clear both cache layers."""
+        super().clear_all()
+        try:
+            self.qdrant.delete_collection(self.collection_name)
+            self._ensure_collection()
+        except Exception:
+            pass
@@ -1,78 +1,183 @@
 """Gemini model router for intelligent model selection."""
+import functools
+import hashlib
+import threading
 import time
 import os
+from collections import deque
+from typing import Any, Dict, Optional, Tuple, Type
 # noinspection PyUnresolvedReference
 from google import genai
 
 
+@functools.lru_cache(maxsize=1)
+def default_genai_client() -> genai.Client:
+    """Process-wide Gemini client, so the HTTP pool and TLS sessions are reused."""
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
 class GeminiRouter:
     """Route to best Gemini model based on task and rate limits."""
     
     def __init__(self, client=None):
         """Initialize all Gemini models."""
-        self.client = client or genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.client = client or default_genai_client()
         # NOTE: These model IDs must exist for the API key.
         # We use IDs returned by `client.models.list()`.
         self.flash_model = "models/gemini-2.0-flash"
         self.pro_model = "models/gemini-pro-latest"
         self.thinking_model = "models/gemini-2.0-flash-thinking-exp-01-21"
         
-        # Simple rate limiting (calls in last 60 seconds)
-        self.flash_calls = []
-        self.pro_calls = []
-        self.thinking_calls = []
+        # Simple rate limiting (call timestamps in last 60 seconds, oldest first)
+        self.flash_calls: deque = deque()
+        self.pro_calls: deque = deque()
+        self.thinking_calls: deque = deque()
+        # Guards the call deques and the response cache (shared across threads)
+        self._rate_lock = threading.Lock()
+        
+        # Response cache: hash(task, model, prompt) -> (response, stored_at)
+        self._resp_cache: Dict[str, Tuple[Any, float]] = {}
+        self.cache_ttl = 3600
+        self.cache_max_size = 512
     
-    def _check_rate_limit(self, calls_list: list, max_rpm: int) -> bool:
-        """Check if rate limit is not exceeded."""
+    @staticmethod
+    def _expire(calls: deque, now: float) -> None:
+        """Drop calls older than 1 minute (timestamps are in order, so pop from the left)."""
+        while calls and now - calls[0] >= 60:
+            calls.popleft()
+    
+    def _check_rate_limit(self, calls: deque, max_rpm: int) -> bool:
+        """Record a call and return True if rate limit is not exceeded."""
         now = time.time()
-        # Remove calls older than 1 minute
-        calls_list[:] = [t for t in calls_list if now - t < 60]
-        return len(calls_list) < max_rpm
+        with self._rate_lock:
+            self._expire(calls, now)
+            if len(calls) < max_rpm:
+                calls.append(now)
+                return True
+            return False
+    
+    def _preferred_model(self, task_type: str, structured: bool = False) -> str:
+        """Model a task is routed to when it is not rate limited.
+        
+        The thinking model has no JSON mode, so structured `decide` calls go
+        to Pro instead.
+        """
+        if task_type in ["analyze", "reason", "complex"]:
+            return self.pro_model
+        if task_type == "decide":
+            return self.pro_model if structured else self.thinking_model
+        return self.flash_model
+    
+    def _cache_key(self, task_type: str, model_id: str, prompt: str, response_schema=None) -> str:
+        """Build the response cache key for a prompt."""
+        schema_name = response_schema.__name__ if response_schema is not None else ""
+        raw = task_type + "|" + model_id + "|" + schema_name + "|" + prompt
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    
+    def _cached(self, key: str):
+        """Return a cached response that is still fresh, or None."""
+        with self._rate_lock:
+            cached = self._resp_cache.get(key)
+        if cached is not None and time.time() - cached[1] < self.cache_ttl:
+            return cached[0]
+        return None
+    
+    def _store(self, key: str, response) -> None:
+        """Cache a response, evicting the oldest entry when full."""
+        with self._rate_lock:
+            self._resp_cache[key] = (response, time.time())
+            if len(self._resp_cache) > self.cache_max_size:
+                # Dicts keep insertion order, so the first key is the oldest entry
+                del self._resp_cache[next(iter(self._resp_cache))]
     
-    def route(self, task_type: str, prompt: str):
-        """Smart routing based on task type."""
+    @staticmethod
+    def _config(response_schema: Optional[Type] = None) -> Optional[dict]:
+        """Generation config requesting JSON that matches the schema, if given."""
+        if response_schema is None:
+            return None
+        return {
+            "response_mime_type": "application/json",
+            "response_schema": response_schema
+        }
+    
+    async def aroute(self, task_type: str, prompt: str, response_schema: Optional[Type] = None):
+        """Smart routing based on task type, serving repeated prompts from cache.
+        
+        Calls go through the non-blocking Gemini client. With a pydantic
+        `response_schema` the model returns validated JSON and the parsed
+        object is available as `response.parsed`. Answers from a Flash
+        fallback (rate limit or error) are not cached, so they are never served
+        under the preferred model's key.
+        """
+        structured = response_schema is not None
+        preferred = self._preferred_model(task_type, structured)
+        key = self._cache_key(task_type, preferred, prompt, response_schema)
+        response = self._cached(key)
+        if response is None:
+            response, model = await self._aroute(task_type, prompt, self._config(response_schema))
+            if model == preferred:
+                self._store(key, response)
+        return response
+    
+    def _select_model(self, task_type: str, structured: bool = False) -> str:
+        """Pick the model for a task, falling back to Flash when rate limited."""
         
         # Quick classification → Flash (fastest, 15 RPM)
         if task_type in ["classify", "extract", "quick"]:
-            if self._check_rate_limit(self.flash_calls, 15):
-                self.flash_calls.append(time.time())
-                return self.client.models.generate_content(model=self.flash_model, contents=prompt)
-            else:
-                return self.client.models.generate_content(model=self.flash_model, contents=prompt)
+            self._check_rate_limit(self.flash_calls, 15)
+            return self.flash_model
         
-        # Complex reasoning → Pro (smartest, 2 RPM)
-        elif task_type in ["analyze", "reason", "complex"]:
+        # Complex reasoning and structured decisions → Pro (smartest, 2 RPM, JSON mode)
+        elif task_type in ["analyze", "reason", "complex"] or (task_type == "decide" and structured):
             if self._check_rate_limit(self.pro_calls, 2):
-                self.pro_calls.append(time.time())
-                return self.client.models.generate_content(model=self.pro_model, contents=prompt)
-            else:
-                return self.client.models.generate_content(model=self.flash_model, contents=prompt)
+                return self.pro_model
+            return self.flash_model
         
         # Decision making → Thinking (10 RPM, reasoning)
         elif task_type == "decide":
             if self._check_rate_limit(self.thinking_calls, 10):
-                self.thinking_calls.append(time.time())
-                try:
-                    return self.client.models.generate_content(model=self.thinking_model, contents=prompt)
-                except Exception:
-                     # Fallback if thinking model fails
-                    return self.client.models.generate_content(model=self.flash_model, contents=prompt)
-            else:
-                return self.client.models.generate_content(model=self.flash_model, contents=prompt)
+                return self.thinking_model
+            return self.flash_model
         
         # Default → Flash
         else:
-            return self.client.models.generate_content(model=self.flash_model, contents=prompt)
+            return self.flash_model
+    
+    async def _aroute(self, task_type: str, prompt: str, config: Optional[dict] = None) -> Tuple[Any, str]:
+        """Call the best available model for the task type (config is set for structured output).
+        
+        Returns the response and the model that actually produced it.
+        """
+        model = self._select_model(task_type, structured=config is not None)
+        try:
+            return await self.client.aio.models.generate_content(model=model, contents=prompt, config=config), model
+        except Exception:
+            if model != self.thinking_model:
+                raise
+            # Fallback if the thinking model fails (structured calls never reach it)
+            response = await self.client.aio.models.generate_content(
+                model=self.flash_model, contents=prompt, config=config
+            )
+            return response, self.flash_model
     
     def get_stats(self) -> dict:
         """Get rate limiting statistics."""
         now = time.time()
-        flash_recent = len([t for t in self.flash_calls if now - t < 60])
-        pro_recent = len([t for t in self.pro_calls if now - t < 60])
-        thinking_recent = len([t for t in self.thinking_calls if now - t < 60])
+        with self._rate_lock:
+            for calls in (self.flash_calls, self.pro_calls, self.thinking_calls):
+                self._expire(calls, now)
+            flash_recent = len(self.flash_calls)
+            pro_recent = len(self.pro_calls)
+            thinking_recent = len(self.thinking_calls)
         
         return {
             "flash": {"used": flash_recent, "limit": 15},
             "pro": {"used": pro_recent, "limit": 2},
             "thinking": {"used": thinking_recent, "limit": 10}
         }
+
+
+@functools.lru_cache(maxsize=1)
+def default_router() -> GeminiRouter:
+    """Process-wide router on the default client (shared rate limits and response cache)."""
+    return GeminiRouter(client=default_genai_client())
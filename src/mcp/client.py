@@ -2,7 +2,7 @@
 
 Connects the agent to the MCP Server and handles tool discovery/execution.
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, Tuple
 from .server import MCPServer
 
 class MCPClient:
@@ -11,26 +11,36 @@ class MCPClient:
     def __init__(self, server: MCPServer):
         self.server = server
         self.available_tools = self.server.list_tools()
+        self._gemini_tools = self._build_gemini_tools()
 
-    def discover_tools(self) -> List[Dict[str, Any]]:
-        """Return tool definitions in Gemini Function format."""
-        
-        gemini_tools = []
-        for tool in self.available_tools:
-            gemini_tool = {
+    def _build_gemini_tools(self) -> Tuple[Dict[str, Any], ...]:
+        """Convert the server's tools to Gemini Function format."""
+        return tuple(
+            {
                 "name": tool.name,
                 "description": tool.description,
                 "parameters": tool.input_schema
             }
-            gemini_tools.append(gemini_tool)
-        
-        return gemini_tools
+            for tool in self.available_tools
+        )
 
-    def call_tool(self, name: str, args: Dict[str, Any]) -> Any:
-        """Call a tool on the server."""
+    def discover_tools(self) -> Tuple[Dict[str, Any], ...]:
+        """Return tool definitions in Gemini Function format.
+
+        The tool set is static, so the definitions are built once and shared.
+        """
+        return self._gemini_tools
+
+    def invalidate(self) -> None:
+        """Re-read the server's tool list (call after tools are added or removed)."""
+        self.available_tools = self.server.list_tools()
+        self._gemini_tools = self._build_gemini_tools()
+
+    async def acall_tool(self, name: str, args: Dict[str, Any]) -> Any:
+        """Call a tool on the server from async code."""
         print(f"MCP Client: Calling tool '{name}' with args {args}")
         try:
-            return self.server.call_tool(name, args)
+            return await self.server.acall_tool(name, args)
         except Exception as e:
             print(f"MCP Tool Error: {e}")
             return {"error": str(e)}
@@ -3,7 +3,8 @@
 This module simulates an MCP Server that exposes tools to the agent.
 See: https://modelcontextprotocol.io/
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from ..cache import SimpleCache
 from ..search import MultiSourceSearch
 
 class Tool:
@@ -16,8 +17,10 @@ class Tool:
 class MCPServer:
     """Simulated MCP Server for Search Tools."""
     
-    def __init__(self):
-        self.search_engine = MultiSourceSearch()
+    def __init__(self, search_engine: Optional[MultiSourceSearch] = None):
+        self.search_engine = search_engine or MultiSourceSearch()
+        # Repeated queries (retries, batch duplicates) are answered from memory
+        self._search_cache = SimpleCache(ttl_hours=1, max_size=128)
         self.tools = [
             Tool(
                 name="search_web",
@@ -35,19 +38,43 @@ class MCPServer:
             )
         ]
 
+        # Tool name -> handler, built once instead of an if-chain per call
+        self._async_dispatch: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+            "search_web": self._asearch_web
+        }
+
     def list_tools(self) -> List[Tool]:
         """List available tools."""
         return self.tools
 
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
-        """Execute a tool call."""
-        if tool_name == "search_web":
-            query = arguments.get("query")
-            if not query:
-                raise ValueError("Query argument is required for search_web")
-            return self.search_engine.search(query)
-        
-        raise ValueError(f"Tool {tool_name} not found")
+    @staticmethod
+    def _query(arguments: Dict[str, Any]) -> str:
+        """Validate and return the search_web query argument."""
+        query = arguments.get("query")
+        if not query:
+            raise ValueError("Query argument is required for search_web")
+        return query
+
+    def _remember(self, query: str, result: dict) -> None:
+        """Cache a search result unless every provider failed."""
+        if result.get("source") != "none":
+            self._search_cache.set(query, result)
+
+    async def _asearch_web(self, arguments: Dict[str, Any]) -> dict:
+        """Async search_web tool handler."""
+        query = self._query(arguments)
+        result = self._search_cache.get(query)
+        if result is None:
+            result = await self.search_engine.asearch(query)
+            self._remember(query, result)
+        return result
+
+    async def acall_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """Execute a tool call without blocking the event loop."""
+        handler = self._async_dispatch.get(tool_name)
+        if handler is None:
+            raise ValueError(f"Tool {tool_name} not found")
+        return await handler(arguments)
 
     def get_quota_status(self):
          return self.search_engine.get_quota_status()
@@ -1,5 +1,9 @@
 """Data models for fact checking system."""
-from typing import TypedDict, List, Optional
+import functools
+from typing import TypedDict, List, Literal, Optional
+
+from pydantic import BaseModel
+from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 
 class FactCheckState(TypedDict):
@@ -14,3 +18,25 @@ class FactCheckState(TypedDict):
     sufficiency: Optional[str]
     search_source: Optional[str]
     cached: bool
+    # Statement a semantic cache hit was verified as (a paraphrase of `statement`)
+    cached_statement: Optional[str]
+    # The analysis + verdict call failed; the result is a fallback and is not cached
+    decision_failed: bool
+
+
+class DomainClassification(BaseModel):
+    """Structured output of the classification agent."""
+    domain: Literal["politics", "economics", "health"]
+
+
+class AnalysisVerdict(BaseModel):
+    """Structured output of the fused analysis + verdict agent."""
+    analysis: str
+    verdict: Literal["true", "false", "insufficient"]
+    explanation: str
+
+
+@functools.lru_cache(maxsize=None)
+def domain_filter(domain: str) -> Filter:
+    """Return the shared payload filter for one domain (built once, never mutated)."""
+    return Filter(must=[FieldCondition(key="domain", match=MatchValue(value=domain))])
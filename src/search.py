@@ -1,11 +1,44 @@
 """Multi-source search with fallback strategy."""
+import asyncio
 import os
+import sys
+import threading
+import weakref
+from typing import Any, Callable, List, Optional, Tuple
+
+import httpx
 # noinspection PyUnresolvedReference
 from ddgs import DDGS
 
+try:
+    from tavily import TavilyClient
+except ImportError:
+    TavilyClient = None
+
+# Appended to every provider query to bias results toward Sri Lankan sources
+QUERY_SUFFIX = sys.intern(" Sri Lanka")
+
+BRAVE_URL = "https://api.search.brave.com/res/v1/web/search"
+
+# One pooled HTTP/2 connection set per event loop: concurrent searches are
+# multiplexed over a single TLS connection per host.
+_HTTP_LIMITS = httpx.Limits(max_connections=32)
+_ASYNC_HTTP: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _async_http() -> httpx.AsyncClient:
+    """Shared HTTP/2 client for the running event loop (async clients can't cross loops)."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_HTTP.get(loop)
+    if client is None:
+        client = _ASYNC_HTTP[loop] = httpx.AsyncClient(http2=True, timeout=10, limits=_HTTP_LIMITS)
+    return client
+
 
 class MultiSourceSearch:
-    """Search across multiple providers with automatic fallback."""
+    """Search across multiple providers, racing them for the fastest answer."""
     
     def __init__(self):
         """Initialize search providers."""
@@ -13,6 +46,12 @@ class MultiSourceSearch:
         self.tavily_api_key = os.getenv("TAVILY_API_KEY")
         self.tavily_count = 0
         self.tavily_limit = 1000
+        # Reused across searches so the HTTP connection pool stays warm
+        self._tavily = (
+            TavilyClient(api_key=self.tavily_api_key)
+            if TavilyClient is not None and self.tavily_api_key
+            else None
+        )
         
         # Brave: 2000/month free
         self.brave_api_key = os.getenv("BRAVE_API_KEY")
@@ -22,6 +61,9 @@ class MultiSourceSearch:
         # DuckDuckGo: unlimited free
         self.ddg = DDGS()
         
+        # Quota counters are bumped from worker threads as well as the event loop
+        self._quota_lock = threading.Lock()
+        
         # Recommended domains for Sinhala queries
         self.recommended_domains = [
             "bbc.com",
@@ -30,63 +72,113 @@ class MultiSourceSearch:
             "lankabusinessonline.com"
         ]
     
-    def search(self, query: str) -> dict:
-        """Try Tavily → Brave → DuckDuckGo."""
-        
-        # Try Tavily first (best quality)
-        if self.tavily_count < self.tavily_limit and self.tavily_api_key:
-            try:
-                return self._tavily_search(query)
-            except ImportError:
-                pass
-        
-        # Fallback to Brave
+    def _available_providers(self) -> List[Tuple[str, Callable[[str], Any]]]:
+        """Providers that currently have a key and quota, best quality first."""
+        providers = []
+        if self._tavily is not None and self.tavily_count < self.tavily_limit:
+            providers.append(("tavily", self._tavily_search))
         if self.brave_api_key and self.brave_count < self.brave_limit:
-            try:
-                return self._brave_search(query)
-            except (ImportError, ValueError):
-                pass
+            providers.append(("brave", self._abrave_search))
+        providers.append(("duckduckgo", self._duckduckgo_search))
+        return providers
+    
+    async def asearch(self, query: str) -> dict:
+        """Race the preferred paid provider against DuckDuckGo; return the first successful result.
         
-        # Final fallback to DuckDuckGo (always works!)
+        Only one paid provider is queried per search so quota isn't spent
+        twice; the other one is tried only if both racers fail. Brave is
+        queried over the shared async HTTP/2 client; Tavily and DuckDuckGo
+        only have sync SDKs and run in worker threads. Losing tasks are
+        cancelled.
+        """
+        *paid, free = self._available_providers()
+        result = await self._race(query, paid[:1] + [free])
+        if result is None and len(paid) > 1:
+            result = await self._race(query, paid[1:])
+        return result if result is not None else self._no_results()
+    
+    async def _race(self, query: str, providers: List[Tuple[str, Callable[[str], Any]]]) -> Optional[dict]:
+        """Run providers concurrently; the first non-empty result wins, None if all fail."""
+        tasks = {
+            asyncio.ensure_future(
+                fn(query) if asyncio.iscoroutinefunction(fn) else asyncio.to_thread(fn, query)
+            ): name
+            for name, fn in providers
+        }
+        pending = set(tasks)
         try:
-            return self._duckduckgo_search(query)
-        except RuntimeError:
-            return {
-                "results": [],
-                "source": "none",
-                "remaining": "unknown"
-            }
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # Errors and empty result lists don't win the race
+                    if task.exception() is None and task.result():
+                        return self._record(tasks[task], task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+        return None
+    
+    def _charge(self, source: str) -> None:
+        """Count a paid provider request as it is sent (a lost race costs quota too)."""
+        with self._quota_lock:
+            if source == "tavily":
+                self.tavily_count += 1
+            elif source == "brave":
+                self.brave_count += 1
+    
+    def _record(self, source: str, results: list) -> dict:
+        """Build the search response for the winning provider."""
+        if source == "tavily":
+            remaining = self.tavily_limit - self.tavily_count
+        elif source == "brave":
+            remaining = self.brave_limit - self.brave_count
+        else:
+            remaining = "unlimited"
+        return {
+            "results": results,
+            "source": source,
+            "remaining": remaining
+        }
     
-    def _tavily_search(self, query: str) -> dict:
+    @staticmethod
+    def _no_results() -> dict:
+        """Response used when every provider failed."""
+        return {
+            "results": [],
+            "source": "none",
+            "remaining": "unknown"
+        }
+    
+    def _tavily_search(self, query: str) -> list:
         """Search using Tavily API."""
-        try:
-            from tavily import TavilyClient
-            client = TavilyClient(api_key=self.tavily_api_key)
-            results = client.search(
-                query + " Sri Lanka",
-                include_domains=self.recommended_domains
-            )
-            self.tavily_count += 1
-            return {
-                "results": results.get("results", []),
-                "source": "tavily",
-                "remaining": self.tavily_limit - self.tavily_count
-            }
-        except ImportError as e:
-            raise ImportError("tavily-python not installed") from e
+        if self._tavily is None:
+            raise ImportError("tavily-python not installed")
+        self._charge("tavily")
+        results = self._tavily.search(
+            query + QUERY_SUFFIX,
+            include_domains=self.recommended_domains
+        )
+        return results.get("results", [])
     
-    def _brave_search(self, query: str) -> dict:
-        """Search using Brave Search API."""
-        import requests
-        
-        url = "https://api.search.brave.com/res/v1/web/search"
+    def _brave_request(self, query: str) -> Tuple[dict, dict]:
+        """Headers and query params for a Brave Search API call."""
         headers = {"X-Subscription-Token": self.brave_api_key}
-        params = {"q": query + " Sri Lanka", "count": 10}
-        
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        data = response.json()
-        
-        results = [
+        params = {"q": query + QUERY_SUFFIX, "count": 10}
+        return headers, params
+    
+    async def _abrave_search(self, query: str) -> list:
+        """Search using Brave Search API without blocking the event loop."""
+        headers, params = self._brave_request(query)
+        self._charge("brave")
+        response = await _async_http().get(BRAVE_URL, headers=headers, params=params)
+        # 401/422/429 error bodies would otherwise parse to an empty result list
+        response.raise_for_status()
+        return self._parse_brave(response.json())
+    
+    @staticmethod
+    def _parse_brave(data: dict) -> list:
+        """Normalize a Brave Search API response."""
+        return [
             {
                 "title": r.get("title", ""),
                 "content": r.get("description", ""),
@@ -94,21 +186,14 @@ class MultiSourceSearch:
             }
             for r in data.get("web", {}).get("results", [])
         ]
-        
-        self.brave_count += 1
-        return {
-            "results": results,
-            "source": "brave",
-            "remaining": self.brave_limit - self.brave_count
-        }
     
-    def _duckduckgo_search(self, query: str) -> dict:
+    def _duckduckgo_search(self, query: str) -> list:
         """Search using DuckDuckGo (unlimited)."""
         results_list = list(
-            self.ddg.text(query + " Sri Lanka", max_results=10)
+            self.ddg.text(query + QUERY_SUFFIX, max_results=10)
         )
         
-        results = [
+        return [
             {
                 "title": r.get("title", ""),
                 "content": r.get("body", ""),
@@ -116,12 +201,6 @@ class MultiSourceSearch:
             }
             for r in results_list
         ]
-        
-        return {
-            "results": results,
-            "source": "duckduckgo",
-            "remaining": "unlimited"
-        }
     
     def get_quota_status(self) -> dict:
         """Get remaining quota for each provider."""
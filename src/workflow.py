@@ -1,48 +1,174 @@
 """LangGraph workflow for fact checking."""
 import asyncio
-import os
+import concurrent.futures
+import functools
 import json
-from typing import Literal
+import re
+import threading
+from typing import List, Literal, Optional, Type
+import numpy as np
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-# noinspection PyUnresolvedReference
-from google import genai
+from pydantic import BaseModel, ValidationError
 
-from .models import FactCheckState
+from .models import FactCheckState, DomainClassification, AnalysisVerdict
 from .vector_store import QdrantVectorStore
-from .gemini_router import GeminiRouter
+from .gemini_router import GeminiRouter, default_genai_client, default_router
 from .mcp.server import MCPServer
 from .mcp.client import MCPClient
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    from google.genai.local_tokenizer import LocalTokenizer
+except ImportError:  # pragma: no cover - older google-genai
+    LocalTokenizer = None
+
+
+# Prompt templates are assembled once at import; agents only fill in the state.
+CLASSIFY_TMPL = """You are an expert classification agent.
+Classify this Sinhala statement into ONE domain: politics, economics, or health.
+
+Statement: {statement}
+
+Respond with ONLY the domain name in English (politics/economics/health).
+If uncertain, default to politics."""
+
+# Analysis and verdict are fused into one structured call after retrieval.
+DECIDE_TMPL = """You are an expert Fact Analysis and Verdict Agent. Analyze the following Sinhala statement against the provided evidence, then determine if the statement is True, False, or if there is Insufficient Information.
+
+Statement: {statement}
+
+Evidence:
+{evidence}
+
+Task:
+1. Compare the statement with the evidence.
+2. Identify ensuring facts and contradictions.
+3. Assess the credibility of the evidence.
+4. Provide a detailed analysis in Sinhala.
+5. Decide the verdict and justify it.
+
+Respond with a JSON object in the following format:
+{{
+    "analysis": "The detailed analysis in Sinhala.",
+    "verdict": "true" | "false" | "insufficient",
+    "explanation": "A clear, concise explanation in Sinhala justifying the verdict."
+}}
+"""
+
+# Markdown code fences Gemini sometimes wraps JSON in
+_FENCE_RE = re.compile(r"^```(?:json)?|```$", re.M)
+
+# Evidence sources and prompt tokens passed to the analysis agent
+MAX_EVIDENCE = 5
+MAX_EVIDENCE_TOKENS = 3000
+TOKENIZER_MODEL = "gemini-2.0-flash"
+
+# Fields a semantic cache hit contributes; the caller's statement is kept
+CACHED_FIELDS = ("analysis", "verdict", "retrieved_docs", "search_results", "sufficiency", "search_source")
+
+
+@functools.lru_cache(maxsize=1)
+def _tokenizer():
+    """Offline Gemini tokenizer, or None if unavailable."""
+    if LocalTokenizer is None:
+        return None
+    try:
+        return LocalTokenizer(model_name=TOKENIZER_MODEL)
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Count Gemini tokens in text (memoized; search results repeat across calls).
+    
+    Falls back to ~4 UTF-8 bytes per token, which is close for both English and
+    Sinhala (3 bytes per character).
+    """
+    tokenizer = _tokenizer()
+    if tokenizer is not None:
+        try:
+            return tokenizer.count_tokens(text).total_tokens
+        except Exception:
+            pass
+    return -(-len(text.encode("utf-8")) // 4)
+
+
+def evidence_block(evidence: List[dict], max_tokens: int = MAX_EVIDENCE_TOKENS) -> str:
+    """Join whole evidence sources until the next one would exceed the token budget.
+    
+    Sources are never cut mid-text, except a first source that alone exceeds the
+    budget, which is shortened proportionally so there is always some evidence.
+    """
+    parts = []
+    used = 0
+    for i, e in enumerate(evidence[:MAX_EVIDENCE]):
+        source = f"Source {i+1}: {e.get('text') or e.get('content') or ''} (URL: {e.get('url', 'N/A')})"
+        tokens = count_tokens(source)
+        if used + tokens > max_tokens:
+            if not parts:
+                parts.append(source[:len(source) * max_tokens // tokens])
+            break
+        parts.append(source)
+        used += tokens
+    return "\n\n".join(parts)
+
+
+@functools.lru_cache(maxsize=1)
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop that runs verify() calls from synchronous code.
+    
+    One long-lived loop (rather than asyncio.run per call) keeps the per-loop
+    async Gemini, Qdrant and HTTP clients and their connections warm.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="workflow-loop", daemon=True).start()
+    return loop
+
 
 class FactCheckingWorkflow:
-    """LangGraph-based fact checking workflow with 4-Agent Architecture."""
+    """LangGraph-based fact checking workflow (classify, retrieve, analyze + decide)."""
     
-    def __init__(self, vector_store: QdrantVectorStore, client=None):
-        """Initialize workflow with dependencies."""
+    def __init__(self, vector_store: QdrantVectorStore, client=None, router=None, search_engine=None, cache=None):
+        """Initialize workflow with dependencies (cache: optional SemanticCache)."""
         self.vector_store = vector_store
+        self.cache = cache
         # Initialize MCP Architecture
-        self.mcp_server = MCPServer()
+        self.mcp_server = MCPServer(search_engine=search_engine)
         self.mcp_client = MCPClient(self.mcp_server)
         
-        self.client = client or genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.router = GeminiRouter(client=self.client)
+        self.client = client or default_genai_client()
+        if router is None:
+            router = default_router() if client is None else GeminiRouter(client=self.client)
+        self.router = router
         self.workflow = self._create_workflow()
+        # Load (and on first run download) the tokenizer now rather than on the
+        # event loop during the first verification
+        _tokenizer()
     
-    def _classify_agent(self, state: FactCheckState) -> FactCheckState:
-        """Agent 1: Domain Classification Agent."""
-        prompt = f"""You are an expert classification agent.
-        Classify this Sinhala statement into ONE domain: politics, economics, or health.
-        
-        Statement: {state['statement']}
-        
-        Respond with ONLY the domain name in English (politics/economics/health).
-        If uncertain, default to politics."""
-        
+    @staticmethod
+    def _structured(response, schema: Type[BaseModel]) -> Optional[BaseModel]:
+        """Return the schema-validated output of a Gemini response, if any."""
+        parsed = getattr(response, "parsed", None)
+        if isinstance(parsed, schema):
+            return parsed
         try:
-            response = self.router.route("classify", prompt)
-            domain = (response.text or "").strip().lower()
-        except (RuntimeError, ValueError):
-            domain = "politics"
+            return schema.model_validate_json(response.text or "")
+        except (ValidationError, ValueError):
+            return None
+    
+    def _apply_domain(self, state: FactCheckState, response) -> FactCheckState:
+        """Store the classified domain, defaulting to politics."""
+        result = self._structured(response, DomainClassification) if response is not None else None
+        if result is not None:
+            domain = result.domain
+        else:
+            domain = (getattr(response, "text", None) or "").strip().lower()
         
         # Validate domain
         if domain not in ["politics", "economics", "health"]:
@@ -51,93 +177,87 @@ class FactCheckingWorkflow:
         state["domain"] = domain
         return state
     
-    def _retrieval_agent(self, state: FactCheckState) -> FactCheckState:
-        """Agent 2: Data Retrieval Agent (Vector + Web via MCP)."""
-        # 1. Search Vector Store (Historical/Context)
-        docs = self.vector_store.search(
-            state["statement"],
-            state["domain"],
-            limit=3
-        )
+    async def _classify_agent(self, state: FactCheckState) -> FactCheckState:
+        """Agent 1: Domain Classification Agent."""
+        prompt = CLASSIFY_TMPL.format_map(state)
         
+        try:
+            response = await self.router.aroute("classify", prompt, response_schema=DomainClassification)
+        except (RuntimeError, ValueError):
+            response = None
+        
+        return self._apply_domain(state, response)
+    
+    async def _retrieval_agent(self, state: FactCheckState, config: RunnableConfig) -> FactCheckState:
+        """Agent 2: Data Retrieval Agent (Vector + Web via MCP).
+        
+        The web query doesn't depend on the domain. Without a semantic cache
+        verify_async starts it at graph entry (passed in as
+        `configurable.web_search`) so it overlaps classification; otherwise it
+        starts here, after a cache miss, so a hit never spends search quota.
+        """
+        configurable = config.get("configurable") or {}
+        web_search = configurable.get("web_search")
+        state["retrieved_docs"], search_res = await asyncio.gather(
+            # 1. Search Vector Store (Historical/Context)
+            self.vector_store.asearch(
+                state["statement"],
+                state["domain"],
+                limit=3,
+                query_vector=await self._query_vector(state, configurable)
+            ),
+            web_search if web_search is not None else self._web_search(state["statement"])
+        )
+        return self._apply_search_results(state, search_res)
+    
+    async def _web_search(self, statement: str) -> dict:
+        """Web half of the retrieval agent."""
         # 2. Web Search via MCP Client
         # The agent uses the MCP Client to call the 'search_web' tool.
         # This follows the MCP architecture: Agent -> Client -> Server -> Tool.
-        search_res = self.mcp_client.call_tool("search_web", {"query": state["statement"]})
-        
-        state["retrieved_docs"] = docs
+        return await self.mcp_client.acall_tool("search_web", {"query": statement})
+    
+    def _apply_search_results(self, state: FactCheckState, search_res: dict) -> FactCheckState:
+        """Store a search_web tool result on the state."""
         state["search_results"] = search_res.get("results", [])
         state["search_source"] = search_res.get("source", "unknown")
         
         return state
     
-    def _analysis_agent(self, state: FactCheckState) -> FactCheckState:
-        """Agent 3: Fact Analysis Agent."""
-        # Combine evidence
-        evidence = state.get("search_results", []) + state.get("retrieved_docs", [])
-        evidence_text = "\n\n".join([
-            f"Source {i+1}: {e.get('text') or e.get('content') or ''} (URL: {e.get('url', 'N/A')})"
-            for i, e in enumerate(evidence[:5])
-        ])
-        
-        if not evidence_text:
-            evidence_text = "No evidence found."
-
-        prompt = f"""You are an expert Fact Analysis Agent. Analyze the following Sinhala statement against the provided evidence.
+    def _decision_prompt(self, state: FactCheckState) -> str:
+        """Build the analysis + verdict prompt from the gathered evidence."""
+        # Combine evidence, keeping whole sources within the token budget
+        evidence = (state.get("search_results") or []) + (state.get("retrieved_docs") or [])
+        evidence_text = evidence_block(evidence) or "No evidence found."
         
-        Statement: {state['statement']}
-        
-        Evidence:
-        {evidence_text[:4000]}
-        
-        Task:
-        1. Compare the statement with the evidence.
-        2. Identify ensuring facts and contradictions.
-        3. Assess the credibility of the evidence.
-        4. Provide a detailed analysis in Sinhala.
-        
-        Output ONLY the analysis in Sinhala."""
-        
-        try:
-            # Use 'analyze' task type for smarter model
-            response = self.router.route("analyze", prompt)
-            state["analysis"] = response.text or "Error generating analysis."
-        except Exception as e:
-            state["analysis"] = f"Analysis failed: {str(e)}"
-        
-        return state
+        return DECIDE_TMPL.format(statement=state["statement"], evidence=evidence_text)
     
-    def _verdict_agent(self, state: FactCheckState) -> FactCheckState:
-        """Agent 4: Verdict Agent."""
-        analysis = state.get("analysis", "")
-        
-        prompt = f"""You are the Final Verdict Agent. Based on the analysis provided, determine if the statement is True, False, or if there is Insufficient Information.
-        
-        Statement: {state['statement']}
-        Analysis: {analysis}
-        
-        Respond with a JSON object in the following format:
-        {{
-            "verdict": "true" | "false" | "insufficient",
-            "explanation": "A clear, concise explanation in Sinhala justifying the verdict."
-        }}
-        """
-        
+    def _apply_decision(self, state: FactCheckState, response) -> FactCheckState:
+        """Store the analysis and verdict (response is None if the call failed) on the state."""
         try:
-            # Use 'decide' or 'pro' for structured output
-            response = self.router.route("decide", prompt)
-            text = response.text or "{}"
-            # cleanup json markdown
-            text = text.replace("```json", "").replace("```", "").strip()
+            if response is None:
+                raise ValueError("No decision response")
+            result = self._structured(response, AnalysisVerdict)
+            if result is not None:
+                data = result.model_dump()
+            else:
+                # Model ignored the schema; parse the raw text
+                # cleanup json markdown
+                text = _FENCE_RE.sub("", response.text or "{}").strip()
+                data = orjson.loads(text.encode("utf-8")) if orjson is not None else json.loads(text)
             
-            data = json.loads(text)
             state["verdict"] = data.get("verdict", "insufficient").lower()
             # Append explanation to analysis or store separately. 
             # For now, we append it to analysis to show in UI easily without changing UI code too much.
+            analysis = data.get("analysis") or "Error generating analysis."
             state["analysis"] = f"{analysis}\n\n**නිගමනය (Verdict):**\n{data.get('explanation', '')}"
+            state["decision_failed"] = not data.get("analysis")
             
         except Exception:
-            # Fallback simple logic
+            # Fallback simple logic: keep any raw text as the analysis
+            analysis = getattr(response, "text", None) or ""
+            state["analysis"] = analysis or "Error generating analysis."
+            state["decision_failed"] = True
             if "සත්‍ය" in analysis or "true" in analysis.lower():
                 state["verdict"] = "true"
             elif "අසත්‍ය" in analysis or "false" in analysis.lower():
@@ -146,45 +266,216 @@ class FactCheckingWorkflow:
                 state["verdict"] = "insufficient"
                 
         return state
+    
+    async def _analysis_verdict_agent(self, state: FactCheckState) -> FactCheckState:
+        """Agent 3: Fact Analysis + Verdict Agent (one structured Gemini call)."""
+        try:
+            # Use 'decide' for the smarter model and structured output
+            # Token counting is CPU work; keep it off the event loop
+            prompt = await asyncio.to_thread(self._decision_prompt, state)
+            response = await self.router.aroute("decide", prompt, response_schema=AnalysisVerdict)
+        except Exception:
+            response = None
+        
+        return self._apply_decision(state, response)
 
     def _create_workflow(self):
-        """Build the 4-Agent LangGraph workflow."""
+        """Build the LangGraph workflow (async nodes, driven with ainvoke)."""
         workflow = StateGraph(FactCheckState)
         
         # Add Agents
         workflow.add_node("classify_agent", self._classify_agent)
+        workflow.add_node("cache_lookup", self._cache_lookup)
         workflow.add_node("retrieval_agent", self._retrieval_agent)
-        workflow.add_node("analysis_agent", self._analysis_agent)
-        workflow.add_node("verdict_agent", self._verdict_agent)
+        workflow.add_node("analysis_verdict_agent", self._analysis_verdict_agent)
         
         # Define Flow
         workflow.set_entry_point("classify_agent")
-        workflow.add_edge("classify_agent", "retrieval_agent")
-        workflow.add_edge("retrieval_agent", "analysis_agent")
-        workflow.add_edge("analysis_agent", "verdict_agent")
-        workflow.add_edge("verdict_agent", END)
+        workflow.add_edge("classify_agent", "cache_lookup")
+        # A cached verdict for a paraphrase in the same domain ends the run
+        workflow.add_conditional_edges(
+            "cache_lookup",
+            lambda state: END if state["cached"] else "retrieval_agent"
+        )
+        workflow.add_edge("retrieval_agent", "analysis_verdict_agent")
+        workflow.add_edge("analysis_verdict_agent", END)
         
         return workflow.compile()
     
-    def verify(self, statement: str) -> dict:
-        """Verify a statement synchronously."""
-        initial_state = {
+    def _initial_state(self, statement: str) -> FactCheckState:
+        """Build the starting state for a statement."""
+        return {
             "statement": statement,
             "domain": "",
             "retrieved_docs": [],
             "search_results": [],
             "analysis": "",
             "verdict": "",
-            "method_used": "4-agent-workflow-mcp",
+            "method_used": "3-agent-workflow-mcp",
             "sufficiency": None,
             "search_source": None,
-            "cached": False
+            "cached": False,
+            "cached_statement": None,
+            "decision_failed": False
         }
+    
+    async def _query_vector(self, state: FactCheckState, configurable: dict):
+        """Statement embedding started by verify_async, or computed now."""
+        query_vector = configurable.get("query_vector")
+        if query_vector is None:
+            return await asyncio.to_thread(self.vector_store.embed, state["statement"])
+        return await query_vector
+    
+    async def _cache_lookup(self, state: FactCheckState, config: RunnableConfig) -> FactCheckState:
+        """Serve a close paraphrase verified before, scoped to the classified domain."""
+        configurable = config.get("configurable") or {}
+        if self.cache is None or not configurable.get("use_cache", True):
+            return state
+        vector = await self._query_vector(state, configurable)
+        hit = await asyncio.to_thread(self.cache.get, state["statement"], state["domain"], vector)
+        if hit:
+            self._apply_cache_hit(state, hit)
+        return state
+    
+    @staticmethod
+    def _apply_cache_hit(state: FactCheckState, hit: dict) -> FactCheckState:
+        """Copy a cached verdict onto the state without replacing the user's statement."""
+        state.update({key: hit[key] for key in CACHED_FIELDS if key in hit})
+        state["cached"] = True
+        state["cached_statement"] = hit.get("statement")
+        return state
+    
+    def _remember(self, statement: str, result: dict, vector=None) -> None:
+        """Store a fresh verdict in the cache, if one is configured.
+        
+        Fallback results of a failed decision call are not cached, so a
+        transient Gemini error isn't served to every paraphrase for a day.
+        """
+        if self.cache is not None and not result.get("decision_failed"):
+            self.cache.set(statement, result, domain=result.get("domain"), vector=vector)
+    
+    def verify(self, statement: str, use_cache: bool = True) -> dict:
+        """Verify a statement synchronously (blocking wrapper around verify_async)."""
+        return self.verify_background(statement, use_cache=use_cache).result()
+    
+    def verify_background(self, statement: str, use_cache: bool = True) -> concurrent.futures.Future:
+        """Start verify_async on the background loop and return its future without waiting."""
+        return asyncio.run_coroutine_threadsafe(
+            self.verify_async(statement, use_cache=use_cache),
+            _background_loop()
+        )
+    
+    async def verify_async(self, statement: str, use_cache: bool = True) -> dict:
+        """Verify a statement asynchronously.
+        
+        Drives the graph with ainvoke: every Gemini, Qdrant and HTTP call is
+        awaited instead of blocking a thread, and the statement embedding runs
+        alongside classification. The embedding is computed once and shared by
+        the cache lookup, vector search and cache write. The (paid) web search
+        only overlaps classification when no cache lookup can end the run.
+        """
+        if use_cache and self.cache is not None:
+            # Exact repeats skip even classification; paraphrases are matched
+            # after it, within the domain (see _cache_lookup)
+            hit = self.cache.get_exact(statement)
+            if hit:
+                return {**hit, "cached": True}
         
-        result = self.workflow.invoke(initial_state)
+        lookup = use_cache and self.cache is not None
+        web_search = None if lookup else asyncio.ensure_future(self._web_search(statement))
+        query_vector = asyncio.ensure_future(asyncio.to_thread(self.vector_store.embed, statement))
+        try:
+            result = await self.workflow.ainvoke(
+                self._initial_state(statement),
+                config={"configurable": {
+                    "web_search": web_search,
+                    "query_vector": query_vector,
+                    "use_cache": use_cache
+                }}
+            )
+        finally:
+            # No-op once retrieval has awaited it; stops it on an early failure
+            if web_search is not None:
+                web_search.cancel()
+        if not result["cached"]:
+            await asyncio.to_thread(self._remember, statement, result, await query_vector)
         return result
     
-    async def verify_async(self, statement: str) -> dict:
-        """Verify a statement asynchronously."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.verify, statement)
+    async def _finish_agents(self, state: FactCheckState) -> FactCheckState:
+        """Run web retrieval and the analysis + verdict agent for an already classified state."""
+        self._apply_search_results(state, await self._web_search(state["statement"]))
+        return await self._analysis_verdict_agent(state)
+    
+    async def verify_batch_async(self, statements: List[str], max_concurrent: int = 10) -> list:
+        """Verify many statements, batching the embedding and vector search stage.
+        
+        Gemini and web stages run per statement (at most `max_concurrent` at a
+        time); the whole batch is embedded in one encoder pass, and that vector
+        serves the domain-scoped cache lookup, the vector search (one Qdrant
+        request per domain) and the cache write. Failed statements are returned
+        as exceptions.
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        results: list = [None] * len(statements)
+        
+        async def run_limited(agent, state):
+            async with semaphore:
+                return await agent(state)
+        
+        # Exact repeats are answered without any model call
+        todo = []
+        for i, statement in enumerate(statements):
+            hit = self.cache.get_exact(statement) if self.cache is not None else None
+            if hit:
+                results[i] = {**hit, "cached": True}
+            else:
+                todo.append(i)
+        if not todo:
+            return results
+        
+        vectors, classified = await asyncio.gather(
+            asyncio.to_thread(self.vector_store.embed, [statements[i] for i in todo]),
+            asyncio.gather(
+                *[run_limited(self._classify_agent, self._initial_state(statements[i])) for i in todo],
+                return_exceptions=True
+            )
+        )
+        vector_of = dict(zip(todo, vectors))
+        ok = []
+        for i, state in zip(todo, classified):
+            results[i] = state
+            if not isinstance(state, BaseException):
+                ok.append(i)
+        
+        if self.cache is not None:
+            hits = await asyncio.gather(*[
+                asyncio.to_thread(self.cache.get, statements[i], results[i]["domain"], vector_of[i])
+                for i in ok
+            ])
+            for i, hit in zip(ok, hits):
+                if hit:
+                    self._apply_cache_hit(results[i], hit)
+            ok = [i for i in ok if not results[i]["cached"]]
+        if not ok:
+            return results
+        
+        docs = await asyncio.to_thread(
+            self.vector_store.search_batch,
+            [statements[i] for i in ok],
+            [results[i]["domain"] for i in ok],
+            3,
+            None,
+            np.stack([vector_of[i] for i in ok])
+        )
+        for i, retrieved in zip(ok, docs):
+            results[i]["retrieved_docs"] = retrieved
+        
+        finished = await asyncio.gather(
+            *[run_limited(self._finish_agents, results[i]) for i in ok],
+            return_exceptions=True
+        )
+        for i, result in zip(ok, finished):
+            results[i] = result
+            if not isinstance(result, BaseException):
+                await asyncio.to_thread(self._remember, statements[i], result, vector_of[i])
+        return results
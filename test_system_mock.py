@@ -7,29 +7,30 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from dotenv import load_dotenv
 load_dotenv()
 
-# We need to mock the Qdrant Client because it fails without C++ redistributable
-# We import QdrantVectorStore but patch its initialization
+import numpy as np
+from qdrant_client import QdrantClient
 
-# Mock the entire qdrant_client module before importing anything that uses it if possible,
-# or just patch the QdrantVectorStore.
-sys.modules["qdrant_client"] = MagicMock()
-sys.modules["qdrant_client.models"] = MagicMock()
-sys.modules["sentence_transformers"] = MagicMock()
-
-# Now import our modules
-# Now import our modules
+from src.vector_store import QdrantVectorStore
 from src.workflow import FactCheckingWorkflow, FactCheckState
 
-# We will define a MockVectorStore instead of using the real one
-class MockVectorStore:
-    def __init__(self, path=""):
-        pass
-    def search(self, query, domain, limit=5):
-        # Return dummy documents for testing
-        return [
-            {"text": "Sample context about Sri Lankan economy.", "source": "mock_db", "score": 0.9},
-            {"text": "Historical GDP data for 2023.", "source": "mock_db", "score": 0.85}
-        ]
+
+def fake_encode(texts, **kwargs):
+    """Deterministic stand-in for SentenceTransformer.encode (no model download)."""
+    if isinstance(texts, list):
+        return np.zeros((len(texts), 768), dtype=np.float32)
+    return np.zeros(768, dtype=np.float32)
+
+
+def make_mock_vector_store() -> QdrantVectorStore:
+    """Real QdrantVectorStore with an injected fake client and encoder."""
+    client = MagicMock(spec=QdrantClient)
+    client.collection_exists.return_value = False
+    # Return dummy documents for testing
+    client.query_points.return_value = MagicMock(points=[
+        MagicMock(payload={"text": "Sample context about Sri Lankan economy.", "source": "mock_db"}, score=0.9),
+        MagicMock(payload={"text": "Historical GDP data for 2023.", "source": "mock_db"}, score=0.85)
+    ])
+    return QdrantVectorStore(client=client, encoder=MagicMock(encode=fake_encode))
 
 def test_production_readiness():
     print("🚀 Starting Production Readiness Assessment...")
@@ -43,11 +44,11 @@ def test_production_readiness():
 
     # 2. Initialize Workflow with Mocks
     try:
-        # Mock Vector Store to bypass C++ issues locally
-        vector_store = MockVectorStore()
+        # Inject a fake Qdrant client and encoder instead of hitting real storage
+        vector_store = make_mock_vector_store()
         
         # Initialize Workflow
-        print("🔄 Initializing 4-Agent Workflow with MCP...")
+        print("🔄 Initializing Agent Workflow with MCP...")
         workflow = FactCheckingWorkflow(vector_store)
         print("✅ Workflow Initialized.")
 
@@ -61,7 +62,7 @@ def test_production_readiness():
         print("\n📊 Analyzing Result:")
         print(f"  - Domain: {result.get('domain')}")
         print(f"  - Verdict: {result.get('verdict')}")
-        print(f"  - Agents Used: Classify->Retrieve->Analyze->Verdict")
+        print(f"  - Agents Used: Classify->Retrieve->Analyze+Verdict")
         
         failures = []
         if result.get("domain") not in ["politics", "economics", "health"]: